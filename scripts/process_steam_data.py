@@ -1,12 +1,11 @@
-import pandas as pd
 import polars as pl
 import numpy as np
 import os
+import io
 import logging
 import pandera as pa
 from pandera import Column, DataFrameSchema, Check
 from sqlalchemy import create_engine, text
-from sqlalchemy.dialects.postgresql import insert
 from abc import ABC, abstractmethod
 from typing import Optional
 from dotenv import load_dotenv
@@ -23,6 +22,49 @@ schema = DataFrameSchema({
     "price": Column(float, Check.ge(0), coerce=True, nullable=True),
     "positive_ratio": Column(float, Check.in_range(0, 1), nullable=True),
 }, strict=False) # strict=False 允許 DataFrame 有額外欄位
+# 驗證抽樣筆數 (Schema 檢查以樣本代表整體，避免整表轉換為 pandas)
+VALIDATION_SAMPLE_SIZE = 10_000
+
+# --- 儀表板衍生欄位設定 ---
+# 發行日期可能的格式 (依序嘗試；月 / 日順序不明時與 pd.to_datetime 相同，先以月份在前解析)
+RELEASE_DATE_FORMATS = [
+    "%Y-%m-%d", "%b %d, %Y", "%d %b, %Y", "%b %Y",
+    "%Y/%m/%d", "%B %d, %Y", "%d %B, %Y", "%d %b %Y", "%d %B %Y",
+    "%m/%d/%Y", "%d/%m/%Y", "%d.%m.%Y", "%Y-%m",
+]
+# 所有格式皆失敗時 (如 "October 2008"、"2008"、"Q3 2024")，退回擷取字串中的四位數年份
+RELEASE_YEAR_PATTERN = r"\b((?:19|20)\d{2})\b"
+# 分箱區間為右閉：(-inf, 0] 為 Free、(0, 10] 為 <$10，依此類推
+PRICE_TIER_BREAKS = [0, 10, 30, 60]
+PRICE_TIER_LABELS = ['Free', '<$10', '$10-30', '$30-60', '>$60']
+REVIEW_TIER_BREAKS = [100, 1000, 10000]
+REVIEW_TIER_LABELS = ['冷門', '小眾', '熱門', '爆款']
+
+# --- steam_games 資料表結構 (欄位需與 DataTransformer 的 final_cols 一致) ---
+GAMES_TABLE_COLUMNS = {
+    'appid': 'BIGINT PRIMARY KEY',
+    'game_title': 'TEXT',
+    'price': 'DOUBLE PRECISION',
+    'release_date': 'TEXT',
+    'genres': 'TEXT',
+    'steamspy_tags': 'TEXT',
+    'owners_avg': 'BIGINT',
+    'total_reviews': 'BIGINT',
+    'positive_ratio': 'DOUBLE PRECISION',
+    'positive': 'BIGINT',
+    'negative': 'BIGINT',
+    'year': 'INTEGER',
+    'main_genre': 'TEXT',
+    'price_tier': 'TEXT',
+    'review_tier': 'TEXT',
+}
+
+# 儀表板篩選條件下推至資料庫時使用的索引 (名稱 -> 定義)
+# 標題 ILIKE 搜尋需要 pg_trgm 擴充套件，無權限建立時略過，不影響資料寫入
+GAMES_TABLE_INDEXES = {
+    'year_price': '(year, price)',
+    'title_trgm': 'USING gin (game_title gin_trgm_ops)',
+}
 
 class SteamConfig:
     # 使用相對路徑定位 data/raw
@@ -54,7 +96,11 @@ class NewSteamDataSource(DataSource):
             if not os.path.exists(self.games_path):
                 raise FileNotFoundError(f"找不到檔案: {self.games_path}")
             
-            df_games = pl.read_csv(self.games_path, ignore_errors=True, infer_schema_length=10000)
+            # Parquet 自帶型別資訊，直接以欄位解碼器讀取；CSV 保留給舊版資料集
+            if self.games_path.endswith('.parquet'):
+                df_games = pl.scan_parquet(self.games_path).collect()
+            else:
+                df_games = pl.read_csv(self.games_path, ignore_errors=True, infer_schema_length=10000)
             logging.info(f"讀取成功: {len(df_games)} 筆遊戲資料")
             return df_games
         except Exception as e:
@@ -63,7 +109,7 @@ class NewSteamDataSource(DataSource):
 
 class DataTransformer:
     @staticmethod
-    def process(df_pl: pl.DataFrame) -> Optional[pd.DataFrame]:
+    def process(df_pl: pl.DataFrame) -> Optional[pl.DataFrame]:
         logging.info("步驟 2/4 & 3/4: Polars 資料清理與特徵計算...")
         try:
             # 1. 欄位映射
@@ -92,7 +138,7 @@ class DataTransformer:
             df = (
                 df
                 .filter(pl.col("appid").is_not_null())
-                .unique(subset=["appid"])
+                .unique(subset=["appid"], maintain_order=True)
                 .with_columns(pl.col("appid").cast(pl.Int64))
             )
 
@@ -127,25 +173,58 @@ class DataTransformer:
                 .alias("positive_ratio")
             )
 
-            # 5. 處理 Owners
-            def parse_owners(val):
-                if not isinstance(val, str): return 0
-                try:
-                    parts = val.replace(',', '').split('-')
-                    return int(sum(int(p) for p in parts) / len(parts))
-                except:
-                    return 0
-
+            # 5. 處理 Owners (原生 Polars 表達式，取區間上下限平均值)
             if "owners_raw" in df.columns:
                 df = df.with_columns(
-                    pl.col("owners_raw").map_elements(parse_owners, return_dtype=pl.Int64).alias("owners_avg")
+                    pl.col("owners_raw")
+                    .cast(pl.Utf8)
+                    .str.replace_all(",", "")
+                    .str.split("-")
+                    .list.eval(pl.element().cast(pl.Int64, strict=False))
+                    .list.mean()
+                    .fill_null(0)
+                    .cast(pl.Int64)
+                    .alias("owners_avg")
                 )
             else:
                 df = df.with_columns(pl.lit(0).alias("owners_avg"))
 
-            # 6. 最終欄位選取
+            # 6. 儀表板衍生欄位 (在 ETL 計算一次，網頁端直接讀取)
+            if "release_date" in df.columns:
+                release_str = pl.col("release_date").cast(pl.Utf8)
+                df = df.with_columns(
+                    pl.coalesce([
+                        pl.coalesce([release_str.str.to_date(fmt, strict=False) for fmt in RELEASE_DATE_FORMATS]).dt.year(),
+                        release_str.str.extract(RELEASE_YEAR_PATTERN).cast(pl.Int32, strict=False),
+                    ])
+                    .alias("year")
+                )
+                unparsed = df.select(
+                    (pl.col("release_date").cast(pl.Utf8).str.strip_chars().str.len_chars() > 0) & pl.col("year").is_null()
+                ).to_series().sum()
+                if unparsed:
+                    logging.warning(f"⚠️ {unparsed} 筆發行日期無法解析，year 為空值 (不會出現在年份篩選中)")
+
+            if "genres" in df.columns:
+                df = df.with_columns(
+                    pl.col("genres").cast(pl.Utf8).str.split(",").list.first().alias("main_genre")
+                )
+                df = df.with_columns(
+                    pl.when(pl.col("main_genre").is_null() | (pl.col("main_genre") == ""))
+                    .then(pl.lit("Unknown"))
+                    .otherwise(pl.col("main_genre"))
+                    .alias("main_genre")
+                )
+
+            df = df.with_columns(
+                pl.col("price").cut(PRICE_TIER_BREAKS, labels=PRICE_TIER_LABELS).cast(pl.Utf8).alias("price_tier"),
+                pl.col("total_reviews").cut(REVIEW_TIER_BREAKS, labels=REVIEW_TIER_LABELS).cast(pl.Utf8).alias("review_tier"),
+            )
+
+            # 7. 最終欄位選取
             final_cols = ['appid', 'game_title', 'price', 'release_date', 'genres', 'steamspy_tags', 
-                         'owners_avg', 'total_reviews', 'positive_ratio', 'positive', 'negative']
+                         'owners_avg', 'total_reviews', 'positive_ratio', 'positive', 'negative',
+                         'year', 'main_genre', 'price_tier', 'review_tier']
             
             final_df_pl = df.select([
                 pl.col(c) if c in df.columns else pl.lit(None).alias(c) for c in final_cols
@@ -153,16 +232,16 @@ class DataTransformer:
 
             logging.info(f"資料處理完成。有效筆數: {len(final_df_pl)}")
             
-            # --- Pandera 驗證 (修復版) ---
-            df_pandas = final_df_pl.to_pandas()
+            # --- Pandera 驗證 (抽樣) ---
+            # 只轉換前 VALIDATION_SAMPLE_SIZE 筆為 pandas 驗證，完整資料維持 Polars 格式交給 Loader
             try:
                 # 使用 validate 函數而不是 SchemaModel.validate
-                schema.validate(df_pandas, lazy=True)
+                schema.validate(final_df_pl.head(VALIDATION_SAMPLE_SIZE).to_pandas(), lazy=True)
                 logging.info("✅ Pandera 資料驗證通過！")
             except pa.errors.SchemaErrors as err:
                 logging.warning(f"⚠️ 資料驗證發現異常 (但程式將繼續執行): {err}")
             
-            return df_pandas
+            return final_df_pl
 
         except Exception as e:
             logging.error(f"資料轉換錯誤: {e}", exc_info=True)
@@ -172,33 +251,62 @@ class DataLoader:
     def __init__(self, db_uri: str):
         self.engine = create_engine(db_uri)
 
-    def _create_upsert_method(self, meta):
-        def method(table, conn, keys, data_iter):
-            sql_table = table.table
-            data_list = [dict(zip(keys, row)) for row in data_iter]
-            stmt = insert(sql_table).values(data_list)
-            update_stmt = stmt.on_conflict_do_update(
-                index_elements=['appid'],
-                set_={c.name: c for c in stmt.excluded if c.name != 'appid'}
+    @staticmethod
+    def _create_table_ddl(table_name: str) -> str:
+        """建表 DDL：appid 自建表起即為主鍵；既有舊表則補上後續新增的欄位"""
+        col_defs = ',\n'.join(f'    "{c}" {t}' for c, t in GAMES_TABLE_COLUMNS.items())
+        add_cols = '\n'.join(
+            f'ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS "{c}" {t};'
+            for c, t in GAMES_TABLE_COLUMNS.items() if c != 'appid'
+        )
+        return f"CREATE TABLE IF NOT EXISTS {table_name} (\n{col_defs}\n);\n{add_cols}"
+
+    def _copy_upsert(self, df: pl.DataFrame, table_name: str):
+        """以 COPY 將整批資料灌入暫存表，再由伺服器端單次 INSERT ... ON CONFLICT 合併"""
+        cols = ', '.join(f'"{c}"' for c in df.columns)
+        updates = ', '.join(f'"{c}" = EXCLUDED."{c}"' for c in df.columns if c != 'appid')
+        
+        buf = io.BytesIO()
+        df.write_csv(buf, include_header=False)
+        buf.seek(0)
+        
+        raw_conn = self.engine.raw_connection()
+        try:
+            cur = raw_conn.cursor()
+            cur.execute(f"CREATE TEMP TABLE stg_{table_name} (LIKE {table_name} INCLUDING DEFAULTS) ON COMMIT DROP")
+            cur.copy_expert(f"COPY stg_{table_name} ({cols}) FROM STDIN WITH CSV", buf)
+            cur.execute(
+                f"INSERT INTO {table_name} ({cols}) SELECT {cols} FROM stg_{table_name} "
+                f"ON CONFLICT (appid) DO UPDATE SET {updates}"
             )
-            conn.execute(update_stmt)
-        return method
+            raw_conn.commit()
+        except Exception:
+            raw_conn.rollback()
+            raise
+        finally:
+            raw_conn.close()
+
+    def _create_indexes(self, table_name: str):
+        """建立篩選用索引；每個索引獨立交易，單一失敗只記錄警告"""
+        statements = ["CREATE EXTENSION IF NOT EXISTS pg_trgm"] + [
+            f"CREATE INDEX IF NOT EXISTS ix_{table_name}_{name} ON {table_name} {definition}"
+            for name, definition in GAMES_TABLE_INDEXES.items()
+        ]
+        for stmt in statements:
+            try:
+                with self.engine.begin() as conn:
+                    conn.execute(text(stmt))
+            except Exception as e:
+                logging.warning(f"⚠️ 略過索引建立 ({stmt}): {e.__class__.__name__}")
 
-    def load(self, df: pd.DataFrame, table_name: str = 'steam_games'):
+    def load(self, df: pl.DataFrame, table_name: str = 'steam_games'):
         logging.info(f"步驟 4/4: 寫入資料庫 ({table_name})...")
         try:
-            df.head(0).to_sql(table_name, self.engine, if_exists='append', index=False)
-            with self.engine.connect() as conn:
-                try:
-                    conn.execute(text(f"ALTER TABLE {table_name} ADD PRIMARY KEY (appid);"))
-                    conn.commit()
-                except Exception:
-                    pass
-
-            df.to_sql(
-                table_name, self.engine, if_exists='append', index=False, 
-                method=self._create_upsert_method(None), chunksize=1000 
-            )
+            with self.engine.begin() as conn:
+                conn.execute(text(self._create_table_ddl(table_name)))
+
+            self._copy_upsert(df, table_name)
+            self._create_indexes(table_name)
             logging.info("✅ ETL 流程成功完成！資料庫已更新。")
         except Exception as e:
             logging.error(f"資料庫寫入失敗: {e}")
@@ -208,12 +316,15 @@ def main():
         logging.error(f"資料夾不存在: {SteamConfig.RAW_DATA_PATH}")
         return
 
-    potential_files = [f for f in os.listdir(SteamConfig.RAW_DATA_PATH) if 'games' in f.lower() and f.endswith('.csv')]
+    potential_files = [f for f in os.listdir(SteamConfig.RAW_DATA_PATH) if 'games' in f.lower() and f.endswith(('.parquet', '.csv'))]
     
     if not potential_files:
-        logging.error(f"在 {SteamConfig.RAW_DATA_PATH} 找不到任何遊戲數據 CSV")
+        logging.error(f"在 {SteamConfig.RAW_DATA_PATH} 找不到任何遊戲數據 (Parquet/CSV)")
         return
 
+    # 同時存在時優先使用 Parquet
+    potential_files.sort(key=lambda f: not f.endswith('.parquet'))
+
     games_csv = os.path.join(SteamConfig.RAW_DATA_PATH, potential_files[0])
     logging.info(f"鎖定目標資料檔: {games_csv}")
     
@@ -221,12 +332,12 @@ def main():
     df_pl = source.fetch_data()
     
     if df_pl is not None:
-        final_df_pandas = DataTransformer.process(df_pl)
-        if final_df_pandas is not None:
+        final_df = DataTransformer.process(df_pl)
+        if final_df is not None:
             try:
                 db_uri = SteamConfig.get_db_uri()
                 loader = DataLoader(db_uri)
-                loader.load(final_df_pandas)
+                loader.load(final_df)
             except ValueError as e:
                 logging.error(e)
 
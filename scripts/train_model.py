@@ -2,9 +2,13 @@ import pandas as pd
 import numpy as np
 import pickle
 import os
+import io
+import re
 from sqlalchemy import create_engine
 from dotenv import load_dotenv
+from scipy.sparse import save_npz
 from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import MultiLabelBinarizer
 
 print("🚀 [1/4] 初始化環境...")
 dotenv_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
@@ -23,8 +27,22 @@ db_uri = f'postgresql://{user}:{password}@{host}:{port}/{dbname}'
 engine = create_engine(db_uri)
 
 print("📥 [2/4] 讀取資料庫...")
+# 只取模型與 Web App 需要的欄位，並以 COPY 一次串流整張結果 (避免逐列建立 Python 物件)
+feature_cols = ['appid', 'game_title', 'genres', 'steamspy_tags', 'price', 'total_reviews', 'positive_ratio']
+query = f"SELECT {', '.join(feature_cols)} FROM steam_games"
 try:
-    df = pd.read_sql("SELECT * FROM steam_games", engine)
+    raw_conn = engine.raw_connection()
+    try:
+        buf = io.StringIO()
+        raw_conn.cursor().copy_expert(f"COPY ({query}) TO STDOUT WITH CSV HEADER", buf)
+    finally:
+        raw_conn.close()
+    buf.seek(0)
+    # 只把空欄位視為 NULL，避免名稱為 "NA"/"None" 的遊戲被誤判為缺值
+    # 文字欄位使用 PyArrow 字串 (連續記憶體)，取代逐筆 Python 物件
+    text_dtype = 'string[pyarrow]'
+    df = pd.read_csv(buf, dtype={'game_title': text_dtype, 'genres': text_dtype, 'steamspy_tags': text_dtype},
+                     keep_default_na=False, na_values=[''])
     print(f"   ✅ 載入 {len(df)} 筆資料")
 except Exception as e:
     print(f"   ❌ 讀取失敗: {e}")
@@ -38,23 +56,61 @@ if 'steamspy_tags' in df.columns:
 else:
     df['content_features'] = df['genres']
 
-# 確保資料都是字串
-df['content_features'] = df['content_features'].astype(str).str.replace(';', ' ').str.replace(',', ' ')
+# 確保資料都是字串，分隔符號 (; 與 ,) 以單一 regex 一次替換為空白
+df['content_features'] = df['content_features'].astype(text_dtype).str.replace(r'[;,]', ' ', regex=True)
 
 # 確保數值欄位正確 (給 Web App 用)
 df['price'] = pd.to_numeric(df['price'], errors='coerce').fillna(0)
 df['total_reviews'] = pd.to_numeric(df['total_reviews'], errors='coerce').fillna(0)
 df['positive_ratio'] = pd.to_numeric(df['positive_ratio'], errors='coerce').fillna(0)
 
-tfidf_vectorizer = TfidfVectorizer(stop_words='english', max_features=5000) # 限制特徵數以加速
+tfidf_vectorizer = TfidfVectorizer(stop_words='english', max_features=5000, dtype=np.float32) # 限制特徵數以加速
 tfidf_matrix = tfidf_vectorizer.fit_transform(df['content_features'])
+# float32 權重 + int32 索引：矩陣體積減半，相似度運算頻寬需求也隨之減半
+if tfidf_matrix.nnz < np.iinfo(np.int32).max:
+    tfidf_matrix.indices = tfidf_matrix.indices.astype(np.int32)
+    tfidf_matrix.indptr = tfidf_matrix.indptr.astype(np.int32)
+
+# 預先計算每款遊戲的 Top-K 相似遊戲 (TF-IDF 已 L2 正規化，內積即 Cosine Similarity)
+# 分批計算 block x N 的相似度，避免一次產生 N x N 稠密矩陣；Web App 查詢時直接查表
+TOP_K_NEIGHBORS = 50
+SIM_BLOCK_ROWS = 512
+n_games = tfidf_matrix.shape[0]
+k = min(TOP_K_NEIGHBORS, n_games - 1)
+neighbors = np.empty((n_games, max(k, 0)), dtype=np.int32)
+neighbor_scores = np.empty((n_games, max(k, 0)), dtype=np.float32)
+if k > 0:
+    matrix_t = tfidf_matrix.T.tocsr()
+    for start in range(0, n_games, SIM_BLOCK_ROWS):
+        stop = min(start + SIM_BLOCK_ROWS, n_games)
+        sims = (tfidf_matrix[start:stop] @ matrix_t).toarray()
+        rows = np.arange(stop - start)
+        sims[rows, rows + start] = -np.inf  # 排除自己
+        # argpartition 只挑出前 K 名候選，再只對這 K 筆排序
+        top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(sims, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind='stable')
+        neighbors[start:stop] = np.take_along_axis(top, order, axis=1)
+        neighbor_scores[start:stop] = np.take_along_axis(top_scores, order, axis=1)
+print(f"   ✅ 已預先計算 Top {k} 相似遊戲")
+
+# 類型標籤轉為 one-hot 稀疏矩陣：推薦理由的「共同標籤」在 Web App 以一次稀疏相乘取得
+# 分隔符號與上方 content_features 相同 (ETL 產出以逗號分隔，舊資料可能使用分號)
+genre_lists = [[t.strip() for t in re.split(r'[;,]', g) if t.strip()] for g in df['genres'].tolist()]
+mlb = MultiLabelBinarizer(sparse_output=True)
+tag_matrix = mlb.fit_transform(genre_lists).tocsr().astype(np.int8)
 
 print("💾 [4/4] 保存模型...")
 model_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'models')
 os.makedirs(model_dir, exist_ok=True)
 
-with open(os.path.join(model_dir, 'tfidf_matrix.pkl'), 'wb') as f:
-    pickle.dump(tfidf_matrix, f)
+# 稀疏矩陣以 .npz (未壓縮) 直接存放 data/indices/indptr 陣列，載入時免去 pickle 反序列化
+save_npz(os.path.join(model_dir, 'tfidf_matrix.npz'), tfidf_matrix, compressed=False)
+# 相似遊戲表以 .npy 存放，Web App 以 memory map 載入 (只讀取被查詢的列)
+np.save(os.path.join(model_dir, 'neighbors.npy'), neighbors)
+np.save(os.path.join(model_dir, 'neighbor_scores.npy'), neighbor_scores)
+save_npz(os.path.join(model_dir, 'tag_matrix.npz'), tag_matrix, compressed=False)
+np.save(os.path.join(model_dir, 'tag_classes.npy'), mlb.classes_.astype(str))
     
 indices = pd.Series(df.index, index=df['game_title']).drop_duplicates()
 with open(os.path.join(model_dir, 'indices.pkl'), 'wb') as f:
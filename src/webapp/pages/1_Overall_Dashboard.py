@@ -1,8 +1,14 @@
 import streamlit as st
 import pandas as pd
+import polars as pl
 import plotly.express as px
+import plotly.graph_objects as go
+import numpy as np
 import os
-from sqlalchemy import create_engine
+import re
+import pyarrow.parquet as pq
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import DBAPIError
 
 # [設定] 頁面初始化 (寬版模式)
 st.set_page_config(page_title="Steam 市場全景儀表板", page_icon="🕹️", layout="wide")
@@ -21,71 +27,426 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # --- 1. 資料存取層 (Data Access Layer) ---
-@st.cache_data(ttl=3600)
+# 儀表板實際使用的欄位 (避免 SELECT * 把整張表搬過網路)
+# year / main_genre / price_tier / review_tier 由 ETL (process_steam_data.py) 預先計算
+KEEP_COLS = ['appid', 'game_title', 'price', 'release_date', 'genres',
+             'positive', 'negative', 'positive_ratio', 'total_reviews',
+             'year', 'main_genre', 'price_tier', 'review_tier']
+# 文字欄位固定為 PyArrow 字串 (避免純數字標題被推斷為數值)
+TEXT_COLS = ['game_title', 'release_date', 'genres', 'main_genre', 'price_tier', 'review_tier']
+# 分箱標籤順序 (需與 ETL 一致)，用於還原有序的 Categorical
+PRICE_TIERS = ['Free', '<$10', '$10-30', '$30-60', '>$60']
+REVIEW_TIERS = ['冷門', '小眾', '熱門', '爆款']
+# 縮窄數值欄位寬度，之後每次掃描 / 分組搬動的位元組隨之減少
+# price 維持 float64 (float32 會讓 59.99 顯示為 59.9900016...)；total_reviews 會被加總，保留 int64
+NARROW_DTYPES = {
+    'year': 'int16[pyarrow]',
+    'positive': 'int32[pyarrow]',
+    'negative': 'int32[pyarrow]',
+    'positive_ratio': 'float[pyarrow]',
+}
+# 篩選結果的固定 Polars Schema (KEEP_COLS 順序，數值寬度同 NARROW_DTYPES，分箱欄位為 Enum)
+# 資料庫與本機兩條路徑都轉為此 Schema，不必為了取得型別而載入整張表
+RESULT_SCHEMA = {
+    'appid': pl.Int64,
+    'game_title': pl.Utf8,
+    'price': pl.Float64,
+    'release_date': pl.Utf8,
+    'genres': pl.Utf8,
+    'positive': pl.Int32,
+    'negative': pl.Int32,
+    'positive_ratio': pl.Float32,
+    'total_reviews': pl.Int64,
+    'year': pl.Int16,
+    'main_genre': pl.Categorical,
+    'price_tier': pl.Enum(PRICE_TIERS),
+    'review_tier': pl.Enum(REVIEW_TIERS),
+}
+# 箱形圖抽樣：資料量超過門檻時每個價格區間最多取樣 N 筆 (分布形狀不變，序列化的 JSON 大幅縮小)
+BOX_SAMPLE_THRESHOLD = 5000
+BOX_SAMPLE_PER_TIER = 2000
+# 詳細資料表最多傳送的列數 (每一列都要經 websocket 序列化到前端)
+DISPLAY_ROW_LIMIT = 5000
+
+@st.cache_resource
+def get_engine():
+    """建立 SQLAlchemy Engine，跨 Session 共用同一個連線池"""
+    db_user = os.getenv('POSTGRES_USER', 'steam_user')
+    db_password = os.getenv('POSTGRES_PASSWORD', 'password')
+    db_host = os.getenv('POSTGRES_HOST', 'localhost')
+    db_port = os.getenv('POSTGRES_PORT', '5432')
+    db_name = os.getenv('POSTGRES_DB', 'steam_db')
+    
+    uri = f'postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}'
+    return create_engine(uri, pool_pre_ping=True)
+
+@st.cache_resource(ttl=3600)
+def db_available():
+    """
+    判斷資料庫是否可用 (連線成功且 steam_games 具備儀表板需要的欄位)，結果跨 Session 共用
+    只在啟動與 ttl 到期時嘗試連線一次，資料庫離線時不必每個篩選條件都等待連線逾時
+    """
+    try:
+        with get_engine().connect() as conn:
+            conn.execute(text(f"SELECT {', '.join(KEEP_COLS)} FROM steam_games LIMIT 0"))
+        return True
+    except DBAPIError:
+        return False
+
+@st.cache_data(ttl=3600, show_spinner=False)
 def load_data():
     """
     [核心功能] 載入遊戲資料
     - 優先連線 PostgreSQL 資料庫 (Production)
-    - 連線失敗則降級讀取 CSV (Development/Fallback)
+    - 資料庫不可用 (db_available) 則降級讀取本機檔案 (Development/Fallback)：
+      CSV 首次使用時轉存為 Parquet，之後以 memory map 只讀取需要的欄位
+    - 欄位皆為 PyArrow 型別 (字串存放於連續記憶體，不再是逐筆 Python 物件)
     """
-    try:
-        db_user = os.getenv('POSTGRES_USER', 'steam_user')
-        db_password = os.getenv('POSTGRES_PASSWORD', 'password')
-        db_host = os.getenv('POSTGRES_HOST', 'localhost')
-        db_port = os.getenv('POSTGRES_PORT', '5432')
-        db_name = os.getenv('POSTGRES_DB', 'steam_db')
-        
-        uri = f'postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}'
-        engine = create_engine(uri)
-        query = "SELECT * FROM steam_games"
-        return pd.read_sql(query, engine)
-    except Exception:
+    if db_available():
+        query = f"SELECT {', '.join(KEEP_COLS)} FROM steam_games"
+        df = pd.read_sql(query, get_engine(), dtype_backend='pyarrow')
+    else:
         base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
         csv_path = os.path.join(base_dir, "data", "processed", "steam_processed_data.csv")
-        return pd.read_csv(csv_path) if os.path.exists(csv_path) else pd.DataFrame()
+        parquet_path = csv_path.replace('.csv', '.parquet')
+        
+        df = None
+        if os.path.exists(csv_path) and (
+            not os.path.exists(parquet_path) or os.path.getmtime(csv_path) > os.path.getmtime(parquet_path)
+        ):
+            # PyArrow 多執行緒解析 CSV，直接產生 Arrow 欄位 (免去 Python tokenizer 與型別推斷)
+            csv_df = pd.read_csv(
+                csv_path, engine='pyarrow', dtype={c: 'string[pyarrow]' for c in TEXT_COLS}, dtype_backend='pyarrow'
+            )
+            try:
+                csv_df.to_parquet(parquet_path, index=False)
+            except OSError:
+                # 資料夾不可寫入 (唯讀掛載等)：直接使用剛解析的 CSV，並移除可能寫到一半的 Parquet
+                try:
+                    os.remove(parquet_path)
+                except OSError:
+                    pass
+                df = csv_df[[c for c in KEEP_COLS if c in csv_df.columns]]
+        if df is None:
+            if not os.path.exists(parquet_path):
+                return pd.DataFrame()
+            
+            available_cols = pq.read_schema(parquet_path).names
+            table = pq.read_table(parquet_path, memory_map=True, columns=[c for c in KEEP_COLS if c in available_cols])
+            df = table.to_pandas(types_mapper=pd.ArrowDtype)
+
+        # 舊版 ETL 的輸出沒有預先計算的欄位 (main_genre / price_tier ...)，提示重跑而不是拋出 KeyError
+        missing_cols = [c for c in KEEP_COLS if c not in df.columns]
+        if missing_cols:
+            st.error(
+                f"❌ 本機資料缺少欄位 {', '.join(missing_cols)} (舊版 ETL 的輸出)，"
+                "請重新執行 `python scripts/process_steam_data.py` (make run-etl)。"
+            )
+            return pd.DataFrame()
+
+    return restore_categories(df)
+
+def restore_categories(df):
+    """
+    統一欄位型別：數值欄位縮窄
+    資料庫 / Polars 不保留類別順序，還原為有序 Categorical 以維持圖表排序
+    """
+    df = df.astype({c: t for c, t in NARROW_DTYPES.items() if c in df.columns})
+    # 主類型重複率極高，轉為 Categorical 後分組 / 比對改以整數代碼進行
+    df['main_genre'] = df['main_genre'].astype('category')
+    df['price_tier'] = pd.Categorical(df['price_tier'], categories=PRICE_TIERS, ordered=True)
+    df['review_tier'] = pd.Categorical(df['review_tier'], categories=REVIEW_TIERS, ordered=True)
+    return df
+
+@st.cache_resource(ttl=3600)
+def load_lazy_frame():
+    """
+    將遊戲資料轉為 Polars LazyFrame 供篩選管線使用 (LazyFrame 不可變，可安全跨 Session 共用)
+    分箱欄位預先轉為 Enum (整數編碼 + 固定類別順序)，篩選結果轉回 pandas 時直接成為 Categorical
+    """
+    return to_polars(load_data()).lazy().cast(RESULT_SCHEMA)
+
+def to_polars(df):
+    """pandas -> Polars，分箱欄位轉為 Enum 以保留類別順序"""
+    return pl.from_pandas(df).with_columns(
+        pl.col('price_tier').cast(pl.Utf8).cast(pl.Enum(PRICE_TIERS)),
+        pl.col('review_tier').cast(pl.Utf8).cast(pl.Enum(REVIEW_TIERS)),
+    )
+
+# 每組篩選條件各佔一份快取 (拖動滑桿會產生大量組合)，限制筆數避免記憶體隨互動無上限成長
+@st.cache_data(ttl=3600, max_entries=64, show_spinner=False)
+def load_filtered(data_version, year_range, price_range, genre_pattern, search_term):
+    """
+    依篩選條件取得遊戲子集 (以資料版本 + 篩選條件為快取鍵，資料更新後不會取回舊結果)
+    - 資料庫可用時將條件下推至 PostgreSQL，只傳回符合條件的資料列 (SQL 錯誤直接顯示，不再誤判為離線)
+    - 資料庫不可用則於本機 LazyFrame 以單一 Polars 述詞過濾
+    """
+    if db_available():
+        conditions = ["year BETWEEN :y0 AND :y1", "price BETWEEN :p0 AND :p1"]
+        params = {'y0': year_range[0], 'y1': year_range[1], 'p0': price_range[0], 'p1': price_range[1]}
+        if genre_pattern:
+            conditions.append("genres ~ :genre_pattern")
+            params['genre_pattern'] = genre_pattern
+        if search_term:
+            # ILIKE 交由 game_title 的 trigram 索引加速；跳脫萬用字元以維持「包含字串」語意
+            conditions.append("game_title ILIKE :title_like ESCAPE '\\'")
+            escaped = search_term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            params['title_like'] = f"%{escaped}%"
+        query = text(f"SELECT {', '.join(KEEP_COLS)} FROM steam_games WHERE {' AND '.join(conditions)}")
+        df = pd.read_sql(query, get_engine(), params=params, dtype_backend='pyarrow')
+        # 查無資料時 read_sql 回傳 object 欄位 (無值可推斷型別)，統一轉為固定的 RESULT_SCHEMA
+        return to_polars(restore_categories(df)).cast(RESULT_SCHEMA)
+    else:
+        filter_expr = pl.col('year').is_between(*year_range) & pl.col('price').is_between(*price_range)
+        if genre_pattern:
+            filter_expr &= pl.col('genres').str.contains(genre_pattern)
+        if search_term:
+            filter_expr &= pl.col('game_title').str.contains(f"(?i){re.escape(search_term)}")
+        return load_lazy_frame().filter(filter_expr).collect(streaming=True)
+
+@st.cache_data(ttl=3600)
+def get_sidebar_meta():
+    """
+    側邊欄需要的選項與邊界 (類型清單、價格上下限、總筆數)，只在資料重新載入時計算一次
+    data_version = (總筆數, 總評論數)：資料更新後隨之改變，作為篩選結果與圖表快取鍵的一部分
+    重跑時只取回這份小字典，不必再複製整張原始資料表；無資料時回傳 None
+    資料庫可用時直接以 SQL 彙總，不必為了幾個邊界值載入整張表
+    """
+    if db_available():
+        engine = get_engine()
+        bounds = pd.read_sql(
+            "SELECT MIN(price) AS price_min, MAX(price) AS price_max, COUNT(*) AS total_rows, "
+            "SUM(total_reviews) AS review_sum FROM steam_games", engine
+        ).iloc[0]
+        if bounds['total_rows'] == 0:
+            return None
+        genres = pd.read_sql(
+            "SELECT DISTINCT main_genre FROM steam_games WHERE main_genre IS NOT NULL", engine
+        )['main_genre']
+        return {
+            'genres': sorted(genres.tolist()),
+            'price_min': int(bounds['price_min']),
+            'price_max': int(bounds['price_max']),
+            'total_rows': int(bounds['total_rows']),
+            'data_version': (int(bounds['total_rows']), int(bounds['review_sum'] or 0)),
+        }
+    df = load_data()
+    if df.empty:
+        return None
+    return {
+        'genres': sorted(df['main_genre'].unique().tolist()),
+        'price_min': int(df['price'].min()),
+        'price_max': int(df['price'].max()),
+        'total_rows': len(df),
+        'data_version': (len(df), int(df['total_reviews'].sum())),
+    }
+
+@st.cache_data
+def build_genre_pattern(genres):
+    """將選取的類型組成單一 alternation regex (同一組選項重複互動時直接取快取)"""
+    return "|".join(map(re.escape, genres))
+
+@st.cache_data(ttl=3600)
+def get_genre_year_stats():
+    """
+    預先彙總「主類型 x 年份」的上架數與平均評論數 (Early Aggregation)
+    背景趨勢只需查表，不必每次互動重新掃描全表
+    資料庫可用時改由 PostgreSQL GROUP BY，只傳回彙總後的小表
+    """
+    if db_available():
+        query = (
+            "SELECT main_genre, year, COUNT(*) AS game_count, AVG(total_reviews)::double precision AS avg_reviews "
+            "FROM steam_games WHERE main_genre IS NOT NULL AND year IS NOT NULL "
+            "GROUP BY main_genre, year ORDER BY main_genre, year"
+        )
+        return pd.read_sql(query, get_engine(), index_col=['main_genre', 'year'])
+    return load_data().groupby(['main_genre', 'year'], observed=True).agg(
+        game_count=('appid', 'size'),
+        avg_reviews=('total_reviews', 'mean'),
+    )
 
-raw_df = load_data()
+sidebar_meta = get_sidebar_meta()
 
 # --- 2. 互動篩選器 (Interactive Sidebar) ---
 with st.sidebar:
     st.header("🔍 市場透鏡 (Filters)")
     
-    if not raw_df.empty:
-        # [ETL] 基本資料清洗
-        raw_df['year'] = pd.to_datetime(raw_df['release_date'], errors='coerce').dt.year
-        raw_df['price_numeric'] = pd.to_numeric(raw_df['price'], errors='coerce').fillna(0)
-        
+    if sidebar_meta:
         # 篩選控制項
         search_term = st.text_input("搜尋遊戲名稱", placeholder="例: Counter-Strike")
         
-        raw_df['main_genre'] = raw_df['genres'].astype(str).apply(lambda x: x.split(',')[0] if x else 'Unknown')
-        all_genres = sorted(raw_df['main_genre'].unique().tolist())
-        selected_genres = st.multiselect("遊戲類型 (Genres)", all_genres, default=[])
+        selected_genres = st.multiselect("遊戲類型 (Genres)", sidebar_meta['genres'], default=[])
         
-        min_p, max_p = int(raw_df['price_numeric'].min()), int(raw_df['price_numeric'].max())
+        min_p, max_p = sidebar_meta['price_min'], sidebar_meta['price_max']
         price_range = st.slider("價格區間 (USD)", min_p, max_p if max_p > 0 else 100, (0, 100))
         
-        min_y, max_y = int(raw_df['year'].min()), int(raw_df['year'].max())
         year_range = st.slider("發行年份", 2000, 2025, (2015, 2025))
         
-        st.caption(f"資料來源: {len(raw_df)} 筆原始數據")
+        st.caption(f"資料來源: {sidebar_meta['total_rows']} 筆原始數據")
 
 # --- 3. 邏輯過濾 (Logic Layer) ---
-if raw_df.empty:
+if not sidebar_meta:
     st.error("❌ 無法載入資料，請先執行 ETL (make run-etl)。")
     st.stop()
 
-df = raw_df.copy()
-# 套用所有篩選條件
-df = df[(df['year'] >= year_range[0]) & (df['year'] <= year_range[1])]
-df = df[(df['price_numeric'] >= price_range[0]) & (df['price_numeric'] <= price_range[1])]
+# 所有篩選條件一次交給 load_filtered (優先下推至資料庫)，結果才轉為 pandas 供 Plotly 使用
+# 單一 alternation regex 一次比對所有選取類型 (向量化，取代逐列 Python lambda)
+genre_pattern = build_genre_pattern(tuple(selected_genres)) if selected_genres else None
+# 快取鍵帶上資料版本：資料重新載入 (ETL 更新) 後不會取回舊的篩選結果 / Figure
+filters = (sidebar_meta['data_version'], year_range, price_range, genre_pattern, search_term)
+filtered = load_filtered(*filters)
+df = filtered.to_pandas()
+
+# 圖表建構函式：以資料版本 + 篩選條件 (filters) 為快取鍵，重複互動 / 切換分頁時直接重用 Figure 物件
+# 以底線開頭的參數 (_df) 不參與雜湊，避免每次重跑都要雜湊整個 DataFrame
+@st.cache_resource(ttl=3600, max_entries=64)
+def build_cp_scatter(filters, _df):
+    """氣泡圖：CP值分析"""
+    return px.scatter(
+        _df, x='price', y='positive_ratio',
+        size='total_reviews', color='main_genre',
+        hover_name='game_title',
+        title='💰 CP 值矩陣：價格 vs. 好評率',
+        labels={'price': '價格 (USD)', 'positive_ratio': '好評率 (0-1)'},
+        size_max=60
+    )
 
-if selected_genres:
-    mask = df['genres'].astype(str).apply(lambda x: any(g in x for g in selected_genres))
-    df = df[mask]
+@st.cache_resource(ttl=3600, max_entries=64)
+def build_top_games_bar(filters, _df):
+    """長條圖：熱門排行"""
+    # 部分選取 (O(N)) 取前 10 名，只把長條圖用到的兩個欄位交給 Plotly
+    top_games = _df.nlargest(10, 'total_reviews')[['game_title', 'total_reviews']]
+    fig_bar = px.bar(
+        top_games, x='total_reviews', y='game_title',
+        orientation='h',
+        title='🔥 流量排行 (Top 10)',
+        labels={'total_reviews': '總評論數', 'game_title': '遊戲名稱'},
+        color='total_reviews', color_continuous_scale='Viridis'
+    )
+    fig_bar.update_layout(yaxis=dict(autorange="reversed"))
+    return fig_bar
+
+@st.cache_resource(ttl=3600, max_entries=64)
+def build_tier_heatmap(filters, _df):
+    """熱力圖：價格區間 x 熱門度的平均好評率"""
+    # 以分箱的類別代碼直接在 NumPy 累加出 (熱門度 x 價格) 矩陣，取代 groupby + pivot
+    codes_p = _df['price_tier'].cat.codes.to_numpy()
+    codes_r = _df['review_tier'].cat.codes.to_numpy()
+    ratios = _df['positive_ratio'].to_numpy(dtype=np.float64, na_value=np.nan)
+    valid = (codes_p >= 0) & (codes_r >= 0) & ~np.isnan(ratios)
+    cell = codes_r[valid] * len(PRICE_TIERS) + codes_p[valid]
+    n_cells = len(REVIEW_TIERS) * len(PRICE_TIERS)
+    sum_mat = np.bincount(cell, weights=ratios[valid], minlength=n_cells).reshape(len(REVIEW_TIERS), len(PRICE_TIERS))
+    cnt_mat = np.bincount(cell, minlength=n_cells).reshape(len(REVIEW_TIERS), len(PRICE_TIERS))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_mat = np.where(cnt_mat > 0, sum_mat / cnt_mat, np.nan)
+    # 只保留實際出現的分箱 (與原本 pivot 的呈現一致)
+    rows, cols = cnt_mat.any(axis=1), cnt_mat.any(axis=0)
+    
+    # 直接以 graph_objects 建圖，略過 plotly.express 的欄位推斷
+    fig_heat = go.Figure(go.Heatmap(
+        z=mean_mat[rows][:, cols],
+        x=[t for t, keep in zip(PRICE_TIERS, cols) if keep],
+        y=[t for t, keep in zip(REVIEW_TIERS, rows) if keep],
+        colorscale='RdBu',
+        texttemplate='%{z:.2f}',
+        colorbar=dict(title="平均好評率"),
+        hovertemplate="價格區間: %{x}<br>熱門度: %{y}<br>平均好評率: %{z}<extra></extra>",
+    ))
+    fig_heat.update_layout(
+        title="🎯 市場熱點：哪種定價策略好評率最高？",
+        xaxis_title="價格區間", yaxis_title="熱門度",
+        yaxis_autorange="reversed",
+    )
+    return fig_heat
+
+@st.cache_resource(ttl=3600, max_entries=64)
+def build_tier_box(filters, _df):
+    """箱形圖：價格區間 x 好評率分佈"""
+    box_df = _df[['price_tier', 'positive_ratio']]
+    if len(box_df) > BOX_SAMPLE_THRESHOLD:
+        # 分層抽樣：打散後每個價格區間保留前 N 筆
+        shuffled = box_df.sample(frac=1, random_state=0)
+        box_df = shuffled[shuffled.groupby('price_tier', observed=True).cumcount() < BOX_SAMPLE_PER_TIER]
+    
+    return px.box(
+        box_df, x='price_tier', y='positive_ratio', color='price_tier',
+        title="📊 定價與品質分佈 (越貴的遊戲真的越好嗎？)",
+        labels={'price_tier':'價格區間', 'positive_ratio':'好評率'},
+        points='outliers'
+    )
+
+@st.cache_data(ttl=3600, max_entries=64)
+def get_year_trend(filters, _filtered):
+    """
+    供給 / 需求趨勢 (2010-2025)：在 Polars 以單次 group_by 同時計算每年上架數與評論總數
+    只把彙總後的小表轉為 pandas 交給 Plotly
+    """
+    return (
+        _filtered.lazy()
+        .filter(pl.col('year').is_between(2010, 2025))
+        .group_by('year')
+        .agg(pl.count().alias('game_count'), pl.col('total_reviews').sum())
+        .sort('year')
+        .collect()
+        .to_pandas()
+        .set_index('year')
+    )
+
+def get_background(filtered):
+    """智慧背景比較：結果極少時以同類型遊戲作為背景，回傳 (類型, 發行年, 預先彙總的查表)"""
+    # 只讀取第一列的兩個欄位
+    target_genre, target_year = filtered.select('main_genre', 'year').row(0)
+    genre_year_stats = get_genre_year_stats()
+    bg_stats = genre_year_stats[
+        genre_year_stats.index.get_level_values('main_genre') == target_genre
+    ].droplevel('main_genre')
+    return target_genre, target_year, bg_stats
+
+@st.cache_resource(ttl=3600, max_entries=64)
+def build_supply_chart(filters, _filtered):
+    """供給端：新遊戲上架數"""
+    # 智慧背景比較：若只選單一遊戲，顯示該類型的背景趨勢
+    if len(_filtered) <= 5: 
+        target_genre, target_year, bg_stats = get_background(_filtered)
+        bg_counts = bg_stats['game_count']
+        bg_counts = bg_counts[(bg_counts.index >= 2010) & (bg_counts.index <= 2025)]
+        
+        fig_supply = px.bar(
+            x=bg_counts.index, y=bg_counts.values,
+            labels={'x':'年份', 'y':f'{target_genre} 新遊戲數'},
+            color_discrete_sequence=['#E0E0E0']
+        )
+        if target_year in bg_counts.index:
+            fig_supply.add_vline(x=target_year, line_width=2, line_dash="dash", line_color="red", annotation_text="發行年")
+    else:
+        year_counts = get_year_trend(filters, _filtered)['game_count']
+        fig_supply = px.bar(
+            x=year_counts.index, y=year_counts.values, 
+            labels={'x':'年份', 'y':'新遊戲數量 (款)'}, 
+            color_discrete_sequence=['#00CC96']
+        )
+    return fig_supply
 
-if search_term:
-    df = df[df['game_title'].astype(str).str.contains(search_term, case=False, na=False)]
+@st.cache_resource(ttl=3600, max_entries=64)
+def build_demand_chart(filters, _filtered):
+    """需求端：玩家評論熱度"""
+    if len(_filtered) <= 5:
+        _, target_year, bg_stats = get_background(_filtered)
+        demand_trend = bg_stats['avg_reviews']
+        demand_trend = demand_trend[(demand_trend.index >= 2010) & (demand_trend.index <= 2025)]
+    else:
+        demand_trend = get_year_trend(filters, _filtered)['total_reviews']
+    
+    fig_demand = px.line(
+        x=demand_trend.index, y=demand_trend.values, 
+        labels={'x':'年份', 'y':'評論熱度'}, 
+        markers=True, 
+        color_discrete_sequence=['#FF6692']
+    )
+    if len(_filtered) <= 5:
+         fig_demand.add_vline(x=target_year, line_width=2, line_dash="dash", line_color="red")
+    return fig_demand
 
 # --- 4. 儀表板視圖 (View Layer) ---
 st.title("🕹️ Steam 遊戲市場全景儀表板")
@@ -95,10 +456,15 @@ if search_term or selected_genres:
 
 # [Part 1] 核心 KPI (Key Performance Indicators)
 k1, k2, k3, k4 = st.columns(4)
-total_games = len(df)
-avg_price = df['price_numeric'].mean() if total_games > 0 else 0
-free_games = df[df['price_numeric'] == 0].shape[0]
-total_reviews = (df['positive'] + df['negative']).sum() if 'positive' in df.columns else 0
+# 四項指標於 Polars 以單次 select 平行計算 (取代多次 pandas 欄位掃描)
+total_games, avg_price, free_games, total_reviews = filtered.select(
+    pl.count().alias('total_games'),
+    pl.col('price').mean().alias('avg_price'),
+    (pl.col('price') == 0).sum().alias('free_games'),
+    # total_reviews 已由 ETL 預先計算 (= positive + negative)，直接加總即可
+    pl.col('total_reviews').sum().alias('total_reviews'),
+).row(0)
+avg_price = avg_price or 0
 
 k1.metric("🎮 篩選遊戲數", f"{total_games:,}")
 k2.metric("💰 平均售價", f"${avg_price:.2f}")
@@ -114,63 +480,23 @@ if 0 < len(df) <= 50:
     m1, m2 = st.columns(2)
     
     with m1:
-        # 氣泡圖：CP值分析
         if 'positive_ratio' in df.columns:
-            fig_scatter = px.scatter(
-                df, x='price_numeric', y='positive_ratio',
-                size='total_reviews', color='main_genre',
-                hover_name='game_title',
-                title='💰 CP 值矩陣：價格 vs. 好評率',
-                labels={'price_numeric': '價格 (USD)', 'positive_ratio': '好評率 (0-1)'},
-                size_max=60
-            )
-            st.plotly_chart(fig_scatter, use_container_width=True)
+            st.plotly_chart(build_cp_scatter(filters, df), use_container_width=True)
             
     with m2:
-        # 長條圖：熱門排行
-        top_games = df.sort_values('total_reviews', ascending=False).head(10)
-        fig_bar = px.bar(
-            top_games, x='total_reviews', y='game_title',
-            orientation='h',
-            title='🔥 流量排行 (Top 10)',
-            labels={'total_reviews': '總評論數', 'game_title': '遊戲名稱'},
-            color='total_reviews', color_continuous_scale='Viridis'
-        )
-        fig_bar.update_layout(yaxis=dict(autorange="reversed"))
-        st.plotly_chart(fig_bar, use_container_width=True)
+        st.plotly_chart(build_top_games_bar(filters, df), use_container_width=True)
 
 else:
     st.subheader("🗺️ 市場機會地圖 (Market Heatmap)")
     st.caption("當資料量龐大時，使用**熱力圖**尋找「高好評、低競爭」的藍海市場。")
     
-    # 資料分箱 (Binning)
-    df['price_tier'] = pd.cut(df['price_numeric'], bins=[-1, 0, 10, 30, 60, 1000], labels=['Free', '<$10', '$10-30', '$30-60', '>$60'])
-    df['review_tier'] = pd.cut(df['total_reviews'], bins=[-1, 100, 1000, 10000, 100000000], labels=['冷門', '小眾', '熱門', '爆款'])
-    
     t1, t2 = st.tabs(["🔥 價格x熱門度 熱力圖", "📦 價格x品質 箱形圖"])
     
     with t1:
-        heatmap_data = df.groupby(['price_tier', 'review_tier'], observed=True)['positive_ratio'].mean().reset_index()
-        heatmap_matrix = heatmap_data.pivot(index='review_tier', columns='price_tier', values='positive_ratio')
-        
-        fig_heat = px.imshow(
-            heatmap_matrix,
-            labels=dict(x="價格區間", y="熱門度", color="平均好評率"),
-            text_auto=".2f",
-            color_continuous_scale='RdBu',
-            aspect="auto",
-            title="🎯 市場熱點：哪種定價策略好評率最高？"
-        )
-        st.plotly_chart(fig_heat, use_container_width=True)
+        st.plotly_chart(build_tier_heatmap(filters, df), use_container_width=True)
         
     with t2:
-        fig_box = px.box(
-            df, x='price_tier', y='positive_ratio', color='price_tier',
-            title="📊 定價與品質分佈 (越貴的遊戲真的越好嗎？)",
-            labels={'price_tier':'價格區間', 'positive_ratio':'好評率'},
-            points='outliers'
-        )
-        st.plotly_chart(fig_box, use_container_width=True)
+        st.plotly_chart(build_tier_box(filters, df), use_container_width=True)
 
 st.divider()
 
@@ -182,63 +508,30 @@ c1, c2 = st.columns(2)
 with c1:
     st.markdown("##### 📦 供給端：新遊戲上架數")
     if not df.empty:
-        year_counts = df['year'].value_counts().sort_index()
-        # 智慧背景比較：若只選單一遊戲，顯示該類型的背景趨勢
-        if len(df) <= 5: 
-            target_genre = df.iloc[0]['main_genre']
-            bg_df = raw_df[raw_df['main_genre'] == target_genre]
-            bg_counts = bg_df['year'].value_counts().sort_index()
-            bg_counts = bg_counts[(bg_counts.index >= 2010) & (bg_counts.index <= 2025)]
-            
-            fig_supply = px.bar(
-                x=bg_counts.index, y=bg_counts.values,
-                labels={'x':'年份', 'y':f'{target_genre} 新遊戲數'},
-                color_discrete_sequence=['#E0E0E0']
-            )
-            target_year = df.iloc[0]['year']
-            if target_year in bg_counts.index:
-                fig_supply.add_vline(x=target_year, line_width=2, line_dash="dash", line_color="red", annotation_text="發行年")
-        else:
-            year_counts = year_counts[(year_counts.index >= 2010) & (year_counts.index <= 2025)]
-            fig_supply = px.bar(
-                x=year_counts.index, y=year_counts.values, 
-                labels={'x':'年份', 'y':'新遊戲數量 (款)'}, 
-                color_discrete_sequence=['#00CC96']
-            )
-            
-        st.plotly_chart(fig_supply, use_container_width=True)
+        st.plotly_chart(build_supply_chart(filters, filtered), use_container_width=True)
 
 with c2:
     st.markdown("##### 🔥 需求端：玩家評論熱度")
     if not df.empty:
-        if len(df) <= 5:
-            target_genre = df.iloc[0]['main_genre']
-            bg_df = raw_df[raw_df['main_genre'] == target_genre]
-            demand_trend = bg_df.groupby('year', observed=True)['total_reviews'].mean().sort_index()
-        else:
-            demand_trend = df.groupby('year', observed=True)['total_reviews'].sum().sort_index()
-            
-        demand_trend = demand_trend[(demand_trend.index >= 2010) & (demand_trend.index <= 2025)]
-        
-        fig_demand = px.line(
-            x=demand_trend.index, y=demand_trend.values, 
-            labels={'x':'年份', 'y':'評論熱度'}, 
-            markers=True, 
-            color_discrete_sequence=['#FF6692']
-        )
-        if len(df) <= 5:
-             fig_demand.add_vline(x=df.iloc[0]['year'], line_width=2, line_dash="dash", line_color="red")
-             
-        st.plotly_chart(fig_demand, use_container_width=True)
+        st.plotly_chart(build_demand_chart(filters, filtered), use_container_width=True)
 
 # [Part 4] 詳細資料表 (Data Grid)
+@st.cache_data(ttl=3600, max_entries=64)
+def build_display_table(filters, _df):
+    """排序後只保留前 DISPLAY_ROW_LIMIT 列，價格格式化也只作用在要顯示的列上"""
+    display_df = _df[['appid', 'game_title', 'price', 'release_date', 'genres', 'positive_ratio', 'total_reviews']]
+    display_df = display_df.sort_values(by='release_date', ascending=False).head(DISPLAY_ROW_LIMIT)
+    # 向量化格式化 (取代逐列 Python lambda)
+    prices = display_df['price'].to_numpy(dtype=np.float64, na_value=np.nan)
+    return display_df.assign(price_display=np.where(prices == 0, "Free", np.char.mod("$%.2f", prices)))
+
 with st.expander("📋 查看詳細資料列表 (點擊展開)", expanded=True):
-    display_df = df[['appid', 'game_title', 'price_numeric', 'release_date', 'genres', 'positive_ratio', 'total_reviews']].copy()
-    display_df['price_display'] = display_df['price_numeric'].apply(lambda x: "Free" if x == 0 else f"${x:.2f}")
+    if len(df) > DISPLAY_ROW_LIMIT:
+        st.caption(f"僅顯示最新 {DISPLAY_ROW_LIMIT:,} 筆 (共 {len(df):,} 筆)，請縮小篩選範圍以查看全部。")
 
     # 修正重點：移除 width='medium'，改回 use_container_width=True
     st.dataframe(
-        display_df.sort_values(by='release_date', ascending=False),
+        build_display_table(filters, df),
         column_config={
             "appid": "App ID",
             "game_title": "遊戲名稱",
@@ -246,7 +539,7 @@ with st.expander("📋 查看詳細資料列表 (點擊展開)", expanded=True):
             "release_date": "發行日期",
             "positive_ratio": st.column_config.ProgressColumn("好評率", min_value=0, max_value=1, format="%.2f"),
             "total_reviews": st.column_config.NumberColumn("評論數"),
-            "price_numeric": None 
+            "price": None 
         },
         use_container_width=True, # 這是讓表格填滿寬度的正確參數
         hide_index=True
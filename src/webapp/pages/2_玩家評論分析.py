@@ -2,8 +2,9 @@ import streamlit as st
 import pandas as pd
 import polars as pl
 import plotly.express as px
+import plotly.graph_objects as go
+import numpy as np
 import os
-from collections import Counter
 import re
 from sqlalchemy import create_engine
 
@@ -23,26 +24,91 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # --- 1. 資料載入層 ---
+@st.cache_resource
+def get_engine():
+    """建立 SQLAlchemy Engine，跨 Session 共用同一個連線池"""
+    db_user = os.getenv('POSTGRES_USER', 'steam_user')
+    db_password = os.getenv('POSTGRES_PASSWORD', 'password')
+    db_host = os.getenv('POSTGRES_HOST', 'localhost')
+    db_port = os.getenv('POSTGRES_PORT', '5432')
+    db_name = os.getenv('POSTGRES_DB', 'steam_db')
+    
+    uri = f'postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}'
+    return create_engine(uri, pool_pre_ping=True)
+
 @st.cache_data(ttl=3600)
 def load_game_list():
-    """從資料庫讀取所有遊戲清單 (ID + Name)，用於下拉選單"""
+    """
+    從資料庫讀取所有遊戲清單 (ID + Name)，用於下拉選單
+    Polars read_database 直接產生欄位式結果，Engine 由 get_engine 共用 (不再每次重建連線池)
+    """
     try:
-        db_user = os.getenv('POSTGRES_USER', 'steam_user')
-        db_password = os.getenv('POSTGRES_PASSWORD', 'password')
-        db_host = os.getenv('POSTGRES_HOST', 'localhost')
-        db_port = os.getenv('POSTGRES_PORT', '5432')
-        db_name = os.getenv('POSTGRES_DB', 'steam_db')
-        
-        uri = f'postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}'
-        engine = create_engine(uri)
         query = "SELECT appid, game_title FROM steam_games"
-        return pd.read_sql(query, engine)
+        return pl.read_database(query, get_engine()).to_pandas()
     except:
         # Fallback 機制
         base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
         csv_path = os.path.join(base_dir, "data", "processed", "steam_processed_data.csv")
         return pd.read_csv(csv_path)[['appid', 'game_title']] if os.path.exists(csv_path) else pd.DataFrame()
 
+def scan_reviews(path):
+    """依副檔名建立評論檔的 LazyFrame (此時只讀取 Schema，不解析資料)"""
+    if path.endswith('.parquet'):
+        return pl.scan_parquet(path)
+    return pl.scan_csv(path, ignore_errors=True)
+
+@st.cache_resource
+def detect_review_schema(path, mtime):
+    """
+    [Schema Inference] 自動偵測欄位，相容不同版本的資料集
+    以 (路徑, 修改時間) 為快取鍵：切換遊戲時直接重用，檔案更新後才重新偵測
+    """
+    schema = scan_reviews(path).schema
+    cols = list(schema.keys())
+    score_col = next((c for c in cols if c in ['voted_up', 'review_score', 'is_positive']), None)
+    id_col = 'app_id' if 'app_id' in cols else 'appid'
+    return {
+        'id': id_col,
+        'id_dtype': schema.get(id_col),
+        'score': score_col,
+        'score_dtype': schema[score_col] if score_col else None,
+        'vote': next((c for c in cols if c in ['votes_up', 'vote_up']), None),
+        'time': next((c for c in cols if c in ['timestamp_created', 'created_at']), None),
+        'text': next((c for c in cols if c in ['review', 'review_text', 'content']), None),
+        'lang': next((c for c in cols if c in ['language', 'lang']), None),
+        'playtime': next((c for c in cols if c in ['author_playtime_forever', 'playtime_forever']), None),
+    }
+
+def appid_predicate(id_col, dtype, target_appid):
+    """
+    AppID 篩選條件：依欄位型別轉換比較的常數，不必把整欄逐列 cast 成 Int64
+    數值欄位直接比較；字串欄位與字串常數比較；其他型別才退回逐列轉換
+    """
+    col = pl.col(id_col)
+    if dtype in pl.NUMERIC_DTYPES:
+        return col == target_appid
+    if dtype == pl.Utf8:
+        return col == str(target_appid)
+    return col.cast(pl.Int64) == target_appid
+
+# 文字評價視為好評的完整值 (需與 merge_reviews.py 的 POSITIVE_SCORE_PATTERN 一致)
+# 錨定整個字串：避免 "-1" 之類的負評因包含 "1" 被誤判為好評
+POSITIVE_SCORE_PATTERN = r"(?i)^\s*(1|true)\s*$"
+
+def is_positive_expr(score_col, dtype):
+    """
+    評價欄位轉為布林 (向量化型別轉換，取代逐列字串比對)
+    布林直接沿用；數值以 > 0 判定 (同時相容 1/0 與 1/-1 編碼)；字串需完整等於 1 / true
+    """
+    col = pl.col(score_col)
+    if dtype == pl.Boolean:
+        expr = col
+    elif dtype in pl.NUMERIC_DTYPES:
+        expr = col > 0
+    else:
+        expr = col.cast(pl.Utf8).str.contains(POSITIVE_SCORE_PATTERN)
+    return expr.fill_null(False)
+
 @st.cache_data(show_spinner=False)
 def load_reviews(target_appid):
     """
@@ -50,26 +116,25 @@ def load_reviews(target_appid):
     只讀取特定 AppID 的資料列，避免將 7GB 檔案全部載入記憶體 (OOM Protection)
     """
     base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
-    reviews_path = os.path.join(base_dir, "data", "raw", "reviews_2024.csv")
+    parquet_path = os.path.join(base_dir, "data", "raw", "reviews_2024.parquet")
+    csv_path = os.path.join(base_dir, "data", "raw", "reviews_2024.csv")
     
-    if not os.path.exists(reviews_path):
-        return None
-
     try:
-        # [Schema Inference] 自動偵測 CSV 欄位，相容不同版本的資料集
-        schema_check = pl.read_csv(reviews_path, n_rows=0)
-        cols = schema_check.columns
-        
-        id_col = 'app_id' if 'app_id' in cols else 'appid'
-        score_col = next((c for c in cols if c in ['voted_up', 'review_score', 'is_positive']), None)
-        vote_col = next((c for c in cols if c in ['votes_up', 'vote_up']), None)
-        time_col = next((c for c in cols if c in ['timestamp_created', 'created_at']), None)
-        text_col = next((c for c in cols if c in ['review', 'review_text', 'content']), None)
-        lang_col = next((c for c in cols if c in ['language', 'lang']), None)
-        playtime_col = next((c for c in cols if c in ['author_playtime_forever', 'playtime_forever']), None)
+        # 優先讀取 merge_reviews.py 產出的 Parquet，舊版 CSV 作為 Fallback
+        if os.path.exists(parquet_path):
+            reviews_path = parquet_path
+        elif os.path.exists(csv_path):
+            reviews_path = csv_path
+        else:
+            return None
+
+        schema = detect_review_schema(reviews_path, os.path.getmtime(reviews_path))
+        id_col, score_col, vote_col = schema['id'], schema['score'], schema['vote']
+        time_col, text_col = schema['time'], schema['text']
+        lang_col, playtime_col = schema['lang'], schema['playtime']
 
         exprs = []
-        if score_col: exprs.append(pl.col(score_col).alias("review_score"))
+        if score_col: exprs.append(is_positive_expr(score_col, schema['score_dtype']).alias("is_positive"))
         if vote_col: exprs.append(pl.col(vote_col).alias("vote_up"))
         if time_col: exprs.append(pl.col(time_col).alias("timestamp_created"))
         if lang_col: exprs.append(pl.col(lang_col).alias("language"))
@@ -80,12 +145,15 @@ def load_reviews(target_appid):
             exprs.append(pl.lit(None).alias("review_text"))
 
         q = (
-            pl.scan_csv(reviews_path, ignore_errors=True)
-            .filter(pl.col(id_col).cast(pl.Int64) == target_appid)
+            scan_reviews(reviews_path)
+            .filter(appid_predicate(id_col, schema['id_dtype'], target_appid))
             .select(exprs)
         )
         
-        df = q.collect().to_pandas()
+        # 串流執行：predicate / projection pushdown 後分批解碼，只有符合 AppID 的資料列進入記憶體
+        # merge_reviews.py 的輸出依 app_id 排序並帶 row group min/max 統計值，不相關的 row group 直接跳過
+        # 轉為 PyArrow 型別的 pandas 欄位，評論全文沿用 Arrow 緩衝區，不再逐筆複製成 Python 字串物件
+        df = q.collect(streaming=True).to_pandas(use_pyarrow_extension_array=True)
         
         if time_col:
             try:
@@ -98,6 +166,44 @@ def load_reviews(target_appid):
         st.error(f"讀取失敗: {e}")
         return pd.DataFrame()
 
+# 遊玩時數箱形圖：評論數超過門檻時改送預先計算的四分位數，不再把每筆評論序列化給 Plotly
+PLAYTIME_BOX_STATS_THRESHOLD = 5000
+
+# 關鍵字分析排除的常見字
+STOPWORDS = ['the', 'and', 'a', 'to', 'of', 'is', 'it', 'in', 'this', 'for', 'game', 'i', 'my', 'but', 'not', 'are', 'was', 'with', 'on', 'have', 'be', 'you', 'that', 'as']
+
+@st.cache_data(show_spinner=False)
+def compute_keywords(target_appid, lang, n=15):
+    """
+    好評 / 負評熱門關鍵字，以 (AppID, 語言) 為快取鍵：切換回已看過的組合時不必重新斷詞
+    Polars 向量化：逐篇小寫 + 擷取單字後展開計數，不再串接成巨大字串交給 Python Counter
+    好評 / 負評在同一次斷詞中依 (is_positive, 單字) 分組，回傳 (好評前 N 名, 負評前 N 名)
+    次數相同時依首次出現的位置排序 (與 Counter.most_common 結果一致)
+    """
+    reviews = load_reviews(target_appid)
+    if lang != 'All':
+        reviews = reviews[reviews['language'] == lang]
+    
+    counts = (
+        pl.from_pandas(reviews[['is_positive', 'review_text']].reset_index(drop=True)).lazy()
+        .select(
+            'is_positive',
+            pl.col('review_text').cast(pl.Utf8).str.to_lowercase()
+            .str.extract_all(r'\b[a-z]{3,15}\b').alias('w'),
+        )
+        .explode('w')
+        .with_row_count('pos')
+        .filter(pl.col('w').is_not_null() & ~pl.col('w').is_in(STOPWORDS))
+        .group_by('is_positive', 'w')
+        .agg(pl.count().alias('count'), pl.col('pos').min().alias('first'))
+        .sort(['count', 'first'], descending=[True, False])
+        .collect()
+    )
+    return tuple(
+        counts.filter(pl.col('is_positive') == flag).head(n).select('w', 'count').rows()
+        for flag in (True, False)
+    )
+
 # --- 2. 側邊欄控制 ---
 game_map = load_game_list()
 
@@ -126,16 +232,19 @@ if selected_appid:
     elif raw_reviews_df.empty:
         st.warning(f"⚠️ 無相關評論資料。")
     else:
-        reviews_df = raw_reviews_df.copy()
+        # st.cache_data 每次回傳的已是獨立副本，之後的篩選皆為唯讀，不需再 copy
+        reviews_df = raw_reviews_df
         
         # [功能] 語言篩選器
+        selected_lang = 'All'
         if 'language' in reviews_df.columns:
+            # 單次 value_counts 同時取得語言清單與各語言筆數，不再逐語言重新掃描整張表
             lang_counts = reviews_df['language'].value_counts()
             available_langs = ['All'] + lang_counts.index.tolist()
             
             st.sidebar.markdown("---")
             st.sidebar.subheader("🌍 語言篩選")
-            lang_labels = [f"{l} ({len(reviews_df[reviews_df['language']==l])})" if l != 'All' else '全部語言' for l in available_langs]
+            lang_labels = ['全部語言'] + [f"{l} ({n})" for l, n in lang_counts.items()]
             selected_lang_idx = st.sidebar.selectbox("選擇語言:", range(len(available_langs)), format_func=lambda x: lang_labels[x])
             selected_lang = available_langs[selected_lang_idx]
             
@@ -144,13 +253,12 @@ if selected_appid:
 
         # 資料前處理
         has_text = reviews_df['review_text'].notnull().any()
-        has_score = 'review_score' in reviews_df.columns
+        has_score = 'is_positive' in reviews_df.columns
         has_time = 'timestamp_created' in reviews_df.columns
         has_playtime = 'playtime_forever' in reviews_df.columns
 
         total_reviews = len(reviews_df)
         if has_score:
-            reviews_df['is_positive'] = reviews_df['review_score'].astype(str).str.contains('1|True', case=False)
             positive_rate = reviews_df['is_positive'].mean() if total_reviews > 0 else 0
         else:
             positive_rate = 0
@@ -172,50 +280,88 @@ if selected_appid:
         # [Chart] 趨勢分析
         if has_time and has_score:
             st.subheader("📈 評論熱度趨勢")
-            reviews_df['month_year'] = reviews_df['timestamp_created'].dt.to_period('M').astype(str)
-            trend_df = reviews_df.groupby(['month_year', 'is_positive'], observed=True).size().reset_index(name='count')
-            trend_df['Sentiment'] = trend_df['is_positive'].map({True: '好評', False: '負評'})
+            # 月份字串與分組計數在同一條 Polars 管線完成，直接產出繪圖用的小表
+            trend_df = (
+                pl.from_pandas(reviews_df[['timestamp_created', 'is_positive']])
+                .lazy()
+                .filter(pl.col('timestamp_created').is_not_null())
+                .group_by(pl.col('timestamp_created').dt.strftime('%Y-%m').alias('month_year'), 'is_positive')
+                .agg(pl.count().alias('count'))
+                .sort(['month_year', 'is_positive'])
+                .collect()
+            )
             
-            fig_trend = px.bar(
-                trend_df, x='month_year', y='count', color='Sentiment',
-                color_discrete_map={'好評': '#00CC96', '負評': '#EF553B'},
-                title="每月評論數量變化"
+            # 直接以 NumPy 陣列建立 go.Bar (每種評價一條)，省去 Plotly Express 的 pandas 轉換層
+            fig_trend = go.Figure([
+                go.Bar(
+                    x=group['month_year'].to_numpy(), y=group['count'].to_numpy(),
+                    name=label, marker_color=color
+                )
+                for flag, label, color in [(True, '好評', '#00CC96'), (False, '負評', '#EF553B')]
+                for group in [trend_df.filter(pl.col('is_positive') == flag)] if len(group)
+            ])
+            fig_trend.update_layout(
+                title="每月評論數量變化", barmode='relative',
+                xaxis_title='month_year', yaxis_title='count', legend_title_text='Sentiment'
             )
             st.plotly_chart(fig_trend, use_container_width=True)
 
         # [Chart] 遊玩時數分析
         if has_playtime and has_score:
             st.subheader("⏳ 遊玩時數與評價")
-            reviews_df['hours_played'] = reviews_df['playtime_forever'] / 60
-            cap = reviews_df['hours_played'].quantile(0.95)
-            filtered_playtime = reviews_df[reviews_df['hours_played'] < cap]
+            # 只取繪圖需要的兩欄，不在整張評論表 (含評論全文) 上新增欄位或複製
+            # 直接在 NumPy 陣列上換算時數、取 95 百分位並篩選，省去 pandas Series 的索引對齊
+            hours_played = reviews_df['playtime_forever'].to_numpy(dtype=np.float64) / 60
+            mask = hours_played < np.nanquantile(hours_played, 0.95)
+            filtered_playtime = pd.DataFrame({
+                'is_positive': reviews_df['is_positive'].to_numpy()[mask], 'hours_played': hours_played[mask]
+            })
             
-            fig_playtime = px.box(
-                filtered_playtime, x='hours_played', y='is_positive', color='is_positive',
-                orientation='h',
-                labels={'is_positive': '評價', 'hours_played': '遊玩時數 (小時)'},
-                color_discrete_map={True: '#00CC96', False: '#EF553B'},
-                category_orders={'is_positive': [True, False]}
-            )
+            colors = {True: '#00CC96', False: '#EF553B'}
+            if len(filtered_playtime) > PLAYTIME_BOX_STATS_THRESHOLD:
+                # 在 Polars 依評價分組計算四分位數與 1.5 IQR 鬚線，每組只傳 5 個數字 (離群點不另外繪製)
+                hours = pl.col('hours_played')
+                q1, q3 = hours.quantile(0.25, 'linear'), hours.quantile(0.75, 'linear')
+                box_stats = (
+                    pl.from_pandas(filtered_playtime[['is_positive', 'hours_played']])
+                    .group_by('is_positive')
+                    .agg(
+                        q1.alias('q1'),
+                        hours.median().alias('median'),
+                        q3.alias('q3'),
+                        hours.filter(hours >= q1 - 1.5 * (q3 - q1)).min().alias('lowerfence'),
+                        hours.filter(hours <= q3 + 1.5 * (q3 - q1)).max().alias('upperfence'),
+                    )
+                    .rows_by_key('is_positive', named=True, unique=True)
+                )
+                fig_playtime = go.Figure([
+                    go.Box(
+                        y=[flag], orientation='h', name=str(flag), marker_color=colors[flag],
+                        **{k: [v] for k, v in box_stats[flag].items()}
+                    )
+                    for flag in (True, False) if flag in box_stats
+                ])
+                fig_playtime.update_layout(xaxis_title='遊玩時數 (小時)', yaxis_title='評價', legend_title_text='評價')
+            else:
+                fig_playtime = px.box(
+                    filtered_playtime, x='hours_played', y='is_positive', color='is_positive',
+                    orientation='h',
+                    labels={'is_positive': '評價', 'hours_played': '遊玩時數 (小時)'},
+                    color_discrete_map=colors,
+                    category_orders={'is_positive': [True, False]}
+                )
             fig_playtime.update_layout(yaxis=dict(tickvals=[True, False], ticktext=['好評', '負評']))
             st.plotly_chart(fig_playtime, use_container_width=True)
 
         # [Chart] 關鍵字分析
         if has_text:
             st.subheader("🔑 熱門關鍵字")
-            stopwords = set(['the', 'and', 'a', 'to', 'of', 'is', 'it', 'in', 'this', 'for', 'game', 'i', 'my', 'but', 'not', 'are', 'was', 'with', 'on', 'have', 'be', 'you', 'that', 'as'])
-            
-            def get_top_words(text_series, n=15):
-                all_text = ' '.join(text_series.dropna().astype(str).tolist()).lower()
-                words = re.findall(r'\b[a-z]{3,15}\b', all_text)
-                words = [w for w in words if w not in stopwords]
-                return Counter(words).most_common(n)
+            pos_words, neg_words = compute_keywords(selected_appid, selected_lang)
 
             col_pos, col_neg = st.columns(2)
             
             with col_pos:
                 st.markdown("##### 😊 好評關鍵字")
-                pos_words = get_top_words(reviews_df[reviews_df['is_positive']]['review_text'])
                 if pos_words:
                     pos_df = pd.DataFrame(pos_words, columns=['Word', 'Count'])
                     fig_pos = px.bar(pos_df, x='Count', y='Word', orientation='h', color_discrete_sequence=['#00CC96'])
@@ -224,7 +370,6 @@ if selected_appid:
 
             with col_neg:
                 st.markdown("##### 😡 負評關鍵字")
-                neg_words = get_top_words(reviews_df[~reviews_df['is_positive']]['review_text'])
                 if neg_words:
                     neg_df = pd.DataFrame(neg_words, columns=['Word', 'Count'])
                     fig_neg = px.bar(neg_df, x='Count', y='Word', orientation='h', color_discrete_sequence=['#EF553B'])
@@ -237,19 +382,22 @@ if selected_appid:
             st.subheader("🔍 評論內容瀏覽")
             filter_type = st.radio("篩選:", ["全部", "好評", "負評"], horizontal=True)
             
-            display_df = reviews_df.copy()
+            display_df = reviews_df
             if filter_type == "好評":
                 display_df = display_df[display_df['is_positive']]
             elif filter_type == "負評":
                 display_df = display_df[~display_df['is_positive']]
                 
-            top_reviews = display_df.sort_values('vote_up', ascending=False).head(20)
+            # 只需前 20 名：nlargest 以 heap 做部分排序，不必對整欄完整排序
+            top_reviews = display_df.nlargest(20, 'vote_up')
             
-            for _, row in top_reviews.iterrows():
-                sentiment_icon = "😊" if row['is_positive'] else "😡"
-                date_str = row['timestamp_created'].date() if pd.notnull(row['timestamp_created']) else ""
-                lang_tag = f"[{row['language']}] " if 'language' in row else ""
-                playtime_str = f" ({int(row['playtime_forever']/60)}h)" if has_playtime else ""
+            # itertuples 回傳輕量 namedtuple，不必像 iterrows 逐列建立 Series
+            has_lang = 'language' in top_reviews.columns
+            for row in top_reviews.itertuples(index=False):
+                sentiment_icon = "😊" if row.is_positive else "😡"
+                date_str = row.timestamp_created.date() if pd.notnull(row.timestamp_created) else ""
+                lang_tag = f"[{row.language}] " if has_lang else ""
+                playtime_str = f" ({int(row.playtime_forever/60)}h)" if has_playtime else ""
                 
-                with st.expander(f"{sentiment_icon} {lang_tag}{date_str}{playtime_str} (有用: {row['vote_up']})"):
-                    st.write(row['review_text'])
\ No newline at end of file
+                with st.expander(f"{sentiment_icon} {lang_tag}{date_str}{playtime_str} (有用: {row.vote_up})"):
+                    st.write(row.review_text)
\ No newline at end of file
@@ -1,8 +1,10 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import pickle
 import os
-from sklearn.metrics.pairwise import linear_kernel
+import re
+from scipy.sparse import load_npz
 
 st.set_page_config(page_title="推薦引擎模擬", page_icon="🤖", layout="wide")
 
@@ -32,7 +34,11 @@ st.markdown("""
 
 @st.cache_resource
 def load_resources():
-    """載入訓練好的 TF-IDF 模型與索引"""
+    """
+    載入訓練好的 TF-IDF 模型與索引
+    預先計算的相似遊戲表以 memory map 開啟 (不佔常駐記憶體)；舊版模型沒有此檔時回傳 None
+    類型標籤矩陣與標籤名稱以 (tag_matrix, tag_classes) 回傳，同樣在缺檔時回傳 None
+    """
     possible_paths = [
         os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))), 'data', 'models'),
         'data/models',
@@ -46,41 +52,76 @@ def load_resources():
             break
             
     if not base_path:
-        return None, None, None
+        return None, None, None, None, None
 
     try:
         with open(os.path.join(base_path, 'games_metadata.pkl'), 'rb') as f: df = pickle.load(f)
-        with open(os.path.join(base_path, 'tfidf_matrix.pkl'), 'rb') as f: mx = pickle.load(f)
+        mx = load_npz(os.path.join(base_path, 'tfidf_matrix.npz'))
         with open(os.path.join(base_path, 'indices.pkl'), 'rb') as f: idx = pickle.load(f)
-        return df, mx, idx
     except Exception:
-        return None, None, None
+        return None, None, None, None, None
+
+    neighbors_path = os.path.join(base_path, 'neighbors.npy')
+    neighbors = np.load(neighbors_path, mmap_mode='r') if os.path.exists(neighbors_path) else None
+    if neighbors is not None and neighbors.shape[0] != mx.shape[0]:
+        neighbors = None
 
-def get_recs_with_explanation(title, df, mx, idx):
+    tags = None
+    tag_matrix_path = os.path.join(base_path, 'tag_matrix.npz')
+    tag_classes_path = os.path.join(base_path, 'tag_classes.npy')
+    if os.path.exists(tag_matrix_path) and os.path.exists(tag_classes_path):
+        tag_mx = load_npz(tag_matrix_path).tocsr()
+        if tag_mx.shape[0] == len(df):
+            tags = (tag_mx, np.load(tag_classes_path))
+    return df, mx, idx, neighbors, tags
+
+def split_tags(genres):
+    """類型字串拆為標籤集合 (分隔符號與訓練時相同：逗號或分號)"""
+    return {t.strip() for t in re.split(r'[;,]', str(genres)) if t.strip()}
+
+def get_recs_with_explanation(title, df, mx, idx, neighbors=None, tags=None):
     """
     [XAI] 可解釋性推薦邏輯
-    1. 計算 Cosine Similarity
+    1. 計算 Cosine Similarity (有預先計算的相似遊戲表時直接查表)
     2. 找出 Top 10 相似遊戲
-    3. 比較兩者標籤，生成「推薦理由」
+    3. 比較兩者標籤，生成「推薦理由」 (有標籤矩陣時以一次稀疏相乘取得所有共同標籤)
     """
     if title not in idx: return []
     i = idx[title]
     if isinstance(i, pd.Series): i = i.iloc[0]
     
-    # 取得輸入遊戲的標籤
-    input_tags = set(str(df.iloc[i]['genres']).split(';')) if 'genres' in df.columns else set()
+    if neighbors is not None and neighbors.shape[1] >= min(10, mx.shape[0] - 1):
+        # 訓練時已排除自己並依相似度排序
+        top_idx = np.asarray(neighbors[i][:10])
+    else:
+        # 稀疏矩陣直接相乘 (TF-IDF 已 L2 正規化，內積即 Cosine Similarity)
+        scores = (mx @ mx[i].T).toarray().ravel()
+        scores[i] = -np.inf  # 排除自己
+        # Top 10 只需部分排序：argpartition O(N) 選出候選，再只對這 10 筆排序
+        k = min(10, scores.size - 1)
+        if k <= 0: return pd.DataFrame()
+        top_idx = np.argpartition(-scores, k - 1)[:k]
+        top_idx = top_idx[np.argsort(-scores[top_idx], kind='stable')]
     
-    scores = linear_kernel(mx[i], mx).flatten()
-    top_idx = scores.argsort()[::-1][1:11] # Top 10 (排除自己)
+    # 產生解釋：找出共同標籤 (每款取前3個共同點)
+    if tags is not None:
+        tag_mx, tag_classes = tags
+        shared = tag_mx[top_idx].multiply(tag_mx[i]).tocsr()
+        common_by_rec = [
+            tag_classes[shared.indices[shared.indptr[j]:shared.indptr[j + 1]]][:3].tolist()
+            for j in range(len(top_idx))
+        ]
+    else:
+        input_tags = split_tags(df.iloc[i]['genres']) if 'genres' in df.columns else set()
+        common_by_rec = [
+            list(input_tags & split_tags(df.iloc[index]['genres']))[:3] if 'genres' in df.columns else []
+            for index in top_idx
+        ]
     
     results = []
-    for index in top_idx:
+    for index, common_tags in zip(top_idx, common_by_rec):
         row = df.iloc[index]
         
-        # 產生解釋：找出共同標籤
-        target_tags = set(str(row['genres']).split(';')) if 'genres' in df.columns else set()
-        common_tags = list(input_tags & target_tags)[:3] # 取前3個共同點
-        
         reason = f"共同特色: {', '.join(common_tags)}" if common_tags else "風格相似"
         if row.get('positive_ratio', 0) > 0.8:
             reason += " | 🔥 極度好評"
@@ -100,7 +141,7 @@ def get_recs_with_explanation(title, df, mx, idx):
 st.title("🚀 AI 遊戲推薦引擎 (Explainable)")
 st.caption("基於 TF-IDF 內容過濾與使用者行為分析 | 效能優化：Polars ETL")
 
-df, mx, idx = load_resources()
+df, mx, idx, neighbors, tags = load_resources()
 
 if df is None:
     st.warning("⚠️ 尚未偵測到模型檔案。請確認 `steam-etl` 容器是否已執行完畢 (make docker-up)。")
@@ -121,7 +162,7 @@ else:
     with c2:
         if run:
             st.subheader(f"🎯 為您推薦：")
-            res_df = get_recs_with_explanation(target, df, mx, idx)
+            res_df = get_recs_with_explanation(target, df, mx, idx, neighbors, tags)
             
             if not res_df.empty:
                 for _, row in res_df.iterrows():
@@ -0,0 +1,84 @@
+import os
+import shutil
+import contextlib
+import pandas as pd
+import pytest
+import streamlit as st
+from sqlalchemy.engine import Engine
+from streamlit.testing.v1 import AppTest
+
+PAGE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "src", "webapp", "pages", "1_Overall_Dashboard.py")
+
+# 模擬資料庫中的遊戲資料 (欄位同儀表板 KEEP_COLS)
+@pytest.fixture
+def games_df():
+    return pd.DataFrame({
+        "appid": [1, 2, 3],
+        "game_title": ["Game A", "Game B", "Game C"],
+        "price": [0.0, 19.99, 59.99],
+        "release_date": ["Oct 21, 2015", "Jan 1, 2018", "Mar 3, 2020"],
+        "genres": ["Action,Adventure", "RPG", "Action"],
+        "positive": [100, 50, 2000],
+        "negative": [10, 50, 100],
+        "positive_ratio": [0.91, 0.5, 0.95],
+        "total_reviews": [110, 100, 2100],
+        "year": [2015, 2018, 2020],
+        "main_genre": ["Action", "RPG", "Action"],
+        "price_tier": ["Free", "$10-30", "$30-60"],
+        "review_tier": ["小眾", "小眾", "熱門"],
+    })
+
+def test_dashboard_empty_pushdown_result(monkeypatch, games_df):
+    """測試資料庫篩選查無資料時 (read_sql 回傳 object 欄位) KPI 仍可正常顯示"""
+    def fake_read_sql(sql, con, params=None, dtype_backend=None, index_col=None, **kwargs):
+        sql = str(sql)
+        if "COUNT(*) AS total_rows" in sql:
+            return pd.DataFrame({"price_min": [games_df["price"].min()], "price_max": [games_df["price"].max()],
+                                 "total_rows": [len(games_df)], "review_sum": [games_df["total_reviews"].sum()]})
+        if "DISTINCT main_genre" in sql:
+            return games_df[["main_genre"]].drop_duplicates()
+        if "GROUP BY main_genre, year" in sql:
+            return games_df.groupby(["main_genre", "year"]).agg(
+                game_count=("appid", "size"), avg_reviews=("total_reviews", "mean"))
+        if params is None:
+            return games_df.convert_dtypes(dtype_backend="pyarrow")
+        # 0 筆結果無值可推斷型別，與 PostgreSQL 實際行為相同：所有欄位皆為 object
+        return pd.DataFrame({c: pd.Series([], dtype=object) for c in games_df.columns})
+
+    @contextlib.contextmanager
+    def fake_connect(self):
+        # 讓 db_available() 的連線探測成功，實際查詢由 fake_read_sql 回應
+        yield type("FakeConnection", (), {"execute": lambda self, stmt: None})()
+
+    monkeypatch.setattr(Engine, "connect", fake_connect)
+    monkeypatch.setattr(pd, "read_sql", fake_read_sql)
+    st.cache_data.clear()
+    st.cache_resource.clear()
+
+    at = AppTest.from_file(PAGE_PATH, default_timeout=60).run()
+    at.text_input[0].set_value("zzzz").run()
+    assert not at.exception
+    metrics = {m.label: m.value for m in at.metric}
+    assert metrics["🎮 篩選遊戲數"] == "0"
+    assert metrics["💰 平均售價"] == "$0.00"
+    assert metrics["📝 總評論數"] == "0"
+
+def test_dashboard_old_csv_asks_to_rerun_etl(tmp_path, monkeypatch, games_df):
+    """測試舊版 ETL 輸出 (缺少 main_genre 等預先計算欄位) 顯示重跑提示，而非 KeyError"""
+    # 頁面以 __file__ 往上四層定位 data/，複製到暫存目錄後改讀測試資料
+    pages_dir = tmp_path / "src" / "webapp" / "pages"
+    pages_dir.mkdir(parents=True)
+    page = shutil.copy(PAGE_PATH, pages_dir)
+    (tmp_path / "data" / "processed").mkdir(parents=True)
+    old_cols = ["appid", "game_title", "price", "release_date", "genres", "positive", "negative", "total_reviews"]
+    games_df[old_cols].to_csv(tmp_path / "data" / "processed" / "steam_processed_data.csv", index=False)
+
+    monkeypatch.setenv("POSTGRES_PORT", "1")
+    st.cache_data.clear()
+    st.cache_resource.clear()
+
+    at = AppTest.from_file(str(page), default_timeout=60).run()
+    assert not at.exception
+    messages = " ".join(e.value for e in at.error)
+    assert "main_genre" in messages
+    assert "process_steam_data.py" in messages
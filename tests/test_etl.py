@@ -1,6 +1,6 @@
 import pytest
 import polars as pl
-from scripts.process_steam_data import DataTransformer
+from scripts.process_steam_data import DataTransformer, NewSteamDataSource
 
 # 測試用假資料
 @pytest.fixture
@@ -18,19 +18,66 @@ def test_price_cleaning(sample_raw_df):
     """測試價格是否有被正確轉為浮點數"""
     df_result = DataTransformer.process(sample_raw_df)
     assert df_result is not None
-    assert df_result.iloc[0]['price'] == 10.0
-    assert df_result.iloc[1]['price'] == 0.0
+    assert df_result['price'][0] == 10.0
+    assert df_result['price'][1] == 0.0
 
 def test_positive_ratio(sample_raw_df):
     """測試好評率計算"""
     df_result = DataTransformer.process(sample_raw_df)
     # Game A: 100 / (100+10) = 0.909
-    assert round(df_result.iloc[0]['positive_ratio'], 2) == 0.91
+    assert round(df_result['positive_ratio'][0], 2) == 0.91
     # Game B: 50 / (50+50) = 0.5
-    assert df_result.iloc[1]['positive_ratio'] == 0.5
+    assert df_result['positive_ratio'][1] == 0.5
 
 def test_owners_parsing(sample_raw_df):
     """測試擁有者區間平均值"""
     df_result = DataTransformer.process(sample_raw_df)
     # "0-20,000" avg = 10000
-    assert df_result.iloc[0]['owners_avg'] == 10000
\ No newline at end of file
+    assert df_result['owners_avg'][0] == 10000
+
+def test_fetch_parquet(tmp_path, sample_raw_df):
+    """測試 Parquet 來源可被正確讀取"""
+    games_path = tmp_path / "games.parquet"
+    sample_raw_df.write_parquet(games_path)
+    df_result = NewSteamDataSource(str(games_path)).fetch_data()
+    assert df_result is not None
+    assert df_result.shape == sample_raw_df.shape
+
+
+def test_owners_parsing_invalid():
+    """測試無法解析的擁有者區間回傳 0"""
+    df_raw = pl.DataFrame({
+        "AppID": [1, 2],
+        "Estimated owners": ["N/A", None],
+    })
+    df_result = DataTransformer.process(df_raw)
+    assert df_result['owners_avg'].to_list() == [0, 0]
+
+
+def test_dashboard_columns():
+    """測試儀表板衍生欄位 (年份、主要類型、分箱)"""
+    df_raw = pl.DataFrame({
+        "AppID": [1, 2],
+        "Price": ["$59.99", "Free"],
+        "Release date": ["Oct 21, 2008", "Coming soon"],
+        "Genres": ["Action,Adventure", None],
+        "Positive": [20000, 10],
+        "Negative": [100, 10],
+    })
+    df_result = DataTransformer.process(df_raw)
+    assert df_result['year'][0] == 2008
+    assert df_result['main_genre'].to_list() == ["Action", "Unknown"]
+    assert df_result['price_tier'].to_list() == ["$30-60", "Free"]
+    assert df_result['review_tier'].to_list() == ["爆款", "冷門"]
+
+
+def test_release_year_formats(caplog):
+    """測試多種發行日期格式皆能取得年份，無法解析的筆數會寫入警告"""
+    release_dates = ["2008/10/21", "October 21, 2008", "21 Oct 2008", "10/21/2008", "October 2008", "2008", "Coming soon"]
+    df_raw = pl.DataFrame({
+        "AppID": list(range(1, len(release_dates) + 1)),
+        "Release date": release_dates,
+    })
+    df_result = DataTransformer.process(df_raw)
+    assert df_result['year'].to_list() == [2008] * 6 + [None]
+    assert "1 筆發行日期無法解析" in caplog.text
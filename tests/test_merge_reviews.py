@@ -0,0 +1,55 @@
+import polars as pl
+import pyarrow.parquet as pq
+import merge_reviews
+
+def test_merge_writes_sorted_row_groups_with_stats(tmp_path, monkeypatch):
+    """測試合併結果依 app_id 排序，且寫出固定大小、帶 min/max 統計值的 row group"""
+    source = tmp_path / "raw_external"
+    source.mkdir()
+    for app_id in [30, 10, 20]:
+        pl.DataFrame({
+            "review_text": [f"review {i}" for i in range(25)],
+            "review_score": [1, -1] * 12 + [1],
+            "vote_up": list(range(25)),
+            "timestamp_created": [1_600_000_000 + i for i in range(25)],
+        }).write_csv(source / f"{app_id}.csv")
+
+    output = tmp_path / "reviews.parquet"
+    monkeypatch.setattr(merge_reviews, "SOURCE_FOLDER", str(source))
+    monkeypatch.setattr(merge_reviews, "OUTPUT_FILE", str(output))
+    monkeypatch.setattr(merge_reviews, "ROW_GROUP_SIZE", 10)
+    merge_reviews.merge_top_reviews_optimized()
+
+    meta = pq.ParquetFile(output).metadata
+    assert meta.num_rows == 75
+    assert meta.num_row_groups == 8
+    app_id_idx = meta.schema.to_arrow_schema().get_field_index("app_id")
+    ranges = []
+    for k in range(meta.num_row_groups):
+        assert meta.row_group(k).num_rows <= 10
+        stats = meta.row_group(k).column(app_id_idx).statistics
+        assert stats.has_min_max
+        ranges.append((stats.min, stats.max))
+    assert ranges == sorted(ranges)
+    assert pl.read_parquet(output)["app_id"].is_sorted()
+    assert not (tmp_path / "reviews.parquet.tmp").exists()
+
+def test_merge_keeps_text_review_scores(tmp_path, monkeypatch):
+    """測試文字編碼的評價 (True / False) 轉為 1 / 0，不會被強制轉型成 null"""
+    source = tmp_path / "raw_external"
+    source.mkdir()
+    pl.DataFrame({
+        "review_text": ["good", "bad", "ok", "meh"],
+        "review_score": ["True", "False", "true", None],
+        "vote_up": [1, 2, 3, 4],
+        "timestamp_created": [1_600_000_000] * 4,
+    }).write_csv(source / "10.csv")
+
+    output = tmp_path / "reviews.parquet"
+    monkeypatch.setattr(merge_reviews, "SOURCE_FOLDER", str(source))
+    monkeypatch.setattr(merge_reviews, "OUTPUT_FILE", str(output))
+    merge_reviews.merge_top_reviews_optimized()
+
+    df = pl.read_parquet(output)
+    assert df["review_score"].dtype == pl.Int8
+    assert df.sort("vote_up")["review_score"].to_list() == [1, 0, 1, None]
@@ -0,0 +1,37 @@
+import os
+import shutil
+import pandas as pd
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+PAGE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "src", "webapp", "pages", "2_玩家評論分析.py")
+
+def test_text_review_scores_are_matched_exactly(tmp_path, monkeypatch):
+    """測試文字評價需完整等於 1 / true 才算好評 ("-1" 不可因包含 "1" 被誤判)"""
+    # 頁面以 __file__ 往上四層定位 data/，複製到暫存目錄後改讀測試資料
+    pages_dir = tmp_path / "src" / "webapp" / "pages"
+    pages_dir.mkdir(parents=True)
+    page = shutil.copy(PAGE_PATH, pages_dir)
+    (tmp_path / "data" / "raw").mkdir(parents=True)
+    (tmp_path / "data" / "processed").mkdir(parents=True)
+    pd.DataFrame({"appid": [10], "game_title": ["Game A"]}).to_csv(
+        tmp_path / "data" / "processed" / "steam_processed_data.csv", index=False
+    )
+    pd.DataFrame({
+        "app_id": [10, 10, 10, 10],
+        "review_text": ["great", "awful", "nice", "boring"],
+        "review_score": ["1", "-1", "true", "false"],
+        "vote_up": [1, 2, 3, 4],
+        "timestamp_created": [1_600_000_000] * 4,
+    }).to_csv(tmp_path / "data" / "raw" / "reviews_2024.csv", index=False)
+
+    # 資料庫不可用時遊戲清單改讀本機 CSV
+    monkeypatch.setenv("POSTGRES_PORT", "1")
+    st.cache_data.clear()
+    st.cache_resource.clear()
+
+    at = AppTest.from_file(str(page), default_timeout=60).run()
+    assert not at.exception
+    metrics = {m.label: m.value for m in at.metric}
+    assert metrics["📝 樣本數"] == "4"
+    assert metrics["👍 好評率"] == "50.0%"